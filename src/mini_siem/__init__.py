@@ -1,37 +1,221 @@
-from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
 from typing import cast
 
+import orjson
+from cachetools import TTLCache
 from fastapi import Depends, FastAPI, HTTPException
-from sqlmodel import Session, select
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import insert, literal
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql._expression_select_cls import SelectOfScalar
 
-from mini_siem.models import Event, Source, create_database, engine
+from mini_siem.models import (
+    AsyncSessionMaker,
+    Event,
+    EventCreate,
+    EventPage,
+    EventRollup,
+    Source,
+    SourceCreate,
+    SourcePage,
+    create_database,
+    engine,
+)
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_database()
+    global _commit_queue, _commit_task
+    await create_database()
+    _commit_queue = asyncio.Queue(maxsize=_COMMIT_QUEUE_SIZE)
+    _commit_task = asyncio.create_task(_commit_worker(_commit_queue))
+    _commit_task.add_done_callback(_commit_worker_done)
     yield
+    _commit_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await _commit_task
+    # Pooled connections each hold an aiosqlite thread; close them on shutdown
+    await engine.dispose()
+
+
+def _dumps(value) -> bytes:
+    try:
+        return orjson.dumps(value)
+    except TypeError:
+        # orjson cannot encode integers beyond 64 bits, which events may hold
+        return json.dumps(jsonable_encoder(value), separators=(",", ":")).encode()
+
+
+class _JSONResponse(ORJSONResponse):
+    """ORJSONResponse that falls back to the standard library for values orjson
+    cannot encode."""
+
+    def render(self, content) -> bytes:
+        try:
+            return super().render(content)
+        except TypeError:
+            return _dumps(content)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=_JSONResponse)
+
+# Above this many events per request, inserts bypass the ORM
+_BULK_INSERT_THRESHOLD = 50
+
+# Serializer for submitted events, built once; dumps a whole batch in one call
+_EVENT_ROWS = TypeAdapter(list[EventCreate])
 
+# Event inserts waiting for the commit worker, with the future each request awaits.
+# Created by the lifespan, so it belongs to the running event loop.
+_commit_queue: asyncio.Queue[tuple[list[dict], asyncio.Future[None]]] | None = None
+_commit_task: asyncio.Task[None] | None = None
+# Most requests waiting for the commit worker. Further requests wait for room,
+# so a burst of writes is held back rather than queued without bound.
+_COMMIT_QUEUE_SIZE = 1024
+# Most requests the commit worker folds into one transaction, bounding how long
+# the first request in a batch waits
+_COMMIT_BATCH_SIZE = 64
+
+# Serialized search responses, keyed by (generation, query). Adding events bumps
+# the generation, so results computed before a write are never served after it.
+# Each worker has its own cache; results from other workers expire with the TTL.
+# The cache is bounded by the total size of the bodies it holds, and larger
+# results are streamed without being kept.
+_search_cache: TTLCache[tuple[int, str], bytes] = TTLCache(
+    maxsize=64 * 1024 * 1024, ttl=5, getsizeof=len
+)
+_SEARCH_CACHE_MAX_BODY = 1024 * 1024
+_search_generation = 0
+# Events fetched from the database and serialized at a time by a search
+_SEARCH_PARTITION_SIZE = 1000
+
+# Bounds for the page size of list endpoints
+_MIN_PAGE_SIZE = 1
+_MAX_PAGE_SIZE = 1000
 
-app = FastAPI(lifespan=lifespan)
 
+def _page_size(limit: int) -> int:
+    return min(max(limit, _MIN_PAGE_SIZE), _MAX_PAGE_SIZE)
 
-def get_session():
-    with Session(engine) as session:
+
+async def get_session():
+    async with AsyncSessionMaker() as session:
         yield session
 
 
+async def _insert_events(session: AsyncSession, rows: list[dict]):
+    if len(rows) > _BULK_INSERT_THRESHOLD:
+        # Large batches go through a single Core executemany, skipping the
+        # ORM unit-of-work bookkeeping for every row
+        await session.execute(insert(Event), rows)
+    else:
+        session.add_all([Event(**row) for row in rows])
+
+
+def _resolve(future: asyncio.Future[None], exc: BaseException | None = None):
+    # The request may have been cancelled while waiting
+    if future.done():
+        return
+    if exc is None:
+        future.set_result(None)
+    else:
+        future.set_exception(exc)
+
+
+async def _commit_worker(queue: asyncio.Queue[tuple[list[dict], asyncio.Future[None]]]):
+    """Commits queued event inserts in groups.
+
+    Every request queued while the previous group was being written is inserted
+    in a single transaction, so concurrent writers share one commit instead of
+    each paying for their own. Whatever goes wrong with a group fails the
+    requests in it, so the worker outlives any single failure.
+    """
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < _COMMIT_BATCH_SIZE:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        try:
+            await _commit_batch(batch)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                _resolve(future, RuntimeError("The commit worker was stopped"))
+            raise
+        except Exception as exc:
+            # Requests already resolved keep their result
+            for _, future in batch:
+                _resolve(future, exc)
+
+
+async def _commit_batch(batch: list[tuple[list[dict], asyncio.Future[None]]]):
+    """Commits a group of queued inserts in one transaction.
+
+    If the group fails, its requests are committed one by one so a bad request
+    only fails itself.
+    """
+    async with AsyncSessionMaker() as session:
+        try:
+            await _insert_events(session, [row for rows, _ in batch for row in rows])
+            await session.commit()
+        except Exception:
+            await session.rollback()
+        else:
+            for _, future in batch:
+                _resolve(future)
+            return
+        for rows, future in batch:
+            try:
+                await _insert_events(session, rows)
+                await session.commit()
+            except Exception as exc:
+                _resolve(future, exc)
+                await session.rollback()
+            else:
+                _resolve(future)
+
+
+def _commit_worker_done(task: asyncio.Task[None]):
+    """Fails the requests still queued once the commit worker has stopped."""
+    if task.cancelled():
+        exc: BaseException = RuntimeError("The commit worker was stopped")
+    else:
+        exc = task.exception() or RuntimeError("The commit worker exited")
+        logger.error("The commit worker failed", exc_info=exc)
+    if _commit_queue is None:
+        return
+    while True:
+        try:
+            _, future = _commit_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        _resolve(future, exc)
+
+
 @app.post(
     "/sources/",
     tags=["source"],
     summary="Add a new source",
     response_description="Source added successfully",
-    response_model=str,
+    response_model=dict[str, str],
 )
-async def add_source(source: Source, session: Session = Depends(get_session)):
-    db_source = Event.model_validate(source)
-    session.add(db_source)
-    session.commit()
+async def add_source(
+    source: SourceCreate, session: AsyncSession = Depends(get_session)
+):
+    # The body was validated on the way in, so build the row without a second pass
+    session.add(Source(**source.model_dump()))
+    await session.commit()
     return {"message": "Source added successfully"}
 
 
@@ -39,12 +223,30 @@ async def add_source(source: Source, session: Session = Depends(get_session)):
     "/sources",
     tags=["source"],
     summary="Get all sources",
-    response_description="List of sources",
-    response_model=list[Source],
+    description="Sources are returned in pages ordered by ID. Pass the returned "
+    "`next_cursor` as `cursor` to fetch the next page.",
+    response_description="Page of sources",
+    responses={200: {"model": SourcePage}},
 )
-def get_sources(session: Session = Depends(get_session)):
-    sources = session.exec(select(Source)).all()
-    return sources
+async def get_sources(
+    limit: int = 100,
+    cursor: int | None = None,
+    session: AsyncSession = Depends(get_session),
+):
+    limit = _page_size(limit)
+    query = select(Source)
+    if cursor is not None:
+        query = query.where(col(Source.id) > cursor)
+    query = query.order_by(col(Source.id).asc()).limit(limit)
+    sources = (await session.exec(query)).all()
+    next_cursor = sources[-1].id if len(sources) == limit else None
+    # Rows come straight from the database, so skip response model validation
+    return _JSONResponse(
+        {
+            "items": [source.model_dump() for source in sources],
+            "next_cursor": next_cursor,
+        }
+    )
 
 
 @app.get(
@@ -54,8 +256,8 @@ def get_sources(session: Session = Depends(get_session)):
     response_description="Source details",
     response_model=Source,
 )
-def get_source(source_id: int, session: Session = Depends(get_session)):
-    source = session.get(Source, source_id)
+async def get_source(source_id: int, session: AsyncSession = Depends(get_session)):
+    source = await session.get(Source, source_id)
     if source is None:
         raise HTTPException(status_code=404, detail="Source not found")
     return source
@@ -71,16 +273,16 @@ def get_source(source_id: int, session: Session = Depends(get_session)):
 async def update_source(
     source_id: int,
     source: Source,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
 ):
-    db_source = session.get(Source, source_id)
+    db_source = await session.get(Source, source_id)
     if db_source is None:
         return {"error": "Log source not found"}
     source_data = source.model_dump(exclude_unset=True)
     db_source.sqlmodel_update(source_data)
     session.add(db_source)
-    session.commit()
-    session.refresh(db_source)
+    await session.commit()
+    await session.refresh(db_source)
     return db_source
 
 
@@ -89,18 +291,27 @@ async def update_source(
     tags=["event"],
     summary="Add a new event or a list of events",
     response_description="Event added successfully",
-    response_model=str,
+    response_model=dict[str, str],
+    responses={503: {"description": "The commit worker is not running"}},
 )
-async def add_event(
-    events: Event | list[Event],
-    session: Session = Depends(get_session),
-):
+async def add_event(events: EventCreate | list[EventCreate]):
     if not isinstance(events, list):
-        events = cast(list[Event], [events])
-    for event in events:
-        db_event = Event.model_validate(event)
-        session.add(db_event)
-    session.commit()
+        events = cast(list[EventCreate], [events])
+    # Events were validated with the request body, so rows need no second pass
+    rows = _EVENT_ROWS.dump_python(events)
+    if _commit_queue is None or _commit_task is None or _commit_task.done():
+        raise HTTPException(status_code=503, detail="The commit worker is not running")
+    # Hand the rows to the commit worker and wait until they are committed. The
+    # worker may stop while the request waits for room in the queue, so wait on
+    # it as well rather than on the future alone.
+    committed = asyncio.get_running_loop().create_future()
+    await _commit_queue.put((rows, committed))
+    await asyncio.wait({committed, _commit_task}, return_when=asyncio.FIRST_COMPLETED)
+    if not committed.done():
+        raise HTTPException(status_code=503, detail="The commit worker is not running")
+    committed.result()
+    global _search_generation
+    _search_generation += 1
     return {"message": "Event added successfully"}
 
 
@@ -108,33 +319,122 @@ async def add_event(
     "/events/",
     tags=["event"],
     summary="Get all events",
-    response_description="List of events",
-    response_model=list[Event],
+    description="Events are returned in pages ordered by ID. Pass the returned "
+    "`next_cursor` as `cursor` to fetch the next page.",
+    response_description="Page of events",
+    responses={200: {"model": EventPage}},
 )
-async def get_events(session: Session = Depends(get_session)):
-    events = session.exec(select(Event)).all()
-    return events
+async def get_events(
+    limit: int = 100,
+    cursor: int | None = None,
+    session: AsyncSession = Depends(get_session),
+):
+    limit = _page_size(limit)
+    query = select(Event)
+    if cursor is not None:
+        query = query.where(col(Event.id) > cursor)
+    query = query.order_by(col(Event.id).asc()).limit(limit)
+    events = (await session.exec(query)).all()
+    next_cursor = events[-1].id if len(events) == limit else None
+    # Rows come straight from the database, so skip response model validation
+    return _JSONResponse(
+        {"items": [event.model_dump() for event in events], "next_cursor": next_cursor}
+    )
 
 
 @app.get(
     "/events/search",
     tags=["event"],
     summary="Search events by query",
+    description="Pass `exists=true` to only check whether any event matches; "
+    'the response is then `{"exists": true}` or `{"exists": false}`.\n\n'
+    "Results are cached for up to 5 seconds. Adding events clears the cache of "
+    "the worker that handled the request only: with several workers "
+    "(`MINI_SIEM_WORKERS`), a search served by another worker can miss events "
+    "added in the last 5 seconds.",
     response_description="List of matching events",
-    response_model=list[Event] | None,
+    responses={
+        200: {"model": list[Event]},
+        400: {"description": "The query is not valid"},
+    },
 )
-def search_events(
+async def search_events(
     query: str,
-    session: Session = Depends(get_session),
+    exists: bool = False,
+    session: AsyncSession = Depends(get_session),
 ):
-    from .parser import generate_event_sql_query, parser
+    from .parser import compile_event_sql_query
+
+    cache_key = (_search_generation, query)
+    body = None if exists else _search_cache.get(cache_key)
+    if body is None:
+        try:
+            sql_query = compile_event_sql_query(query)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        if exists:
+            # Stop at the first match instead of loading every matching event
+            hit = await session.scalar(sql_query.with_only_columns(literal(1)).limit(1))
+            return _JSONResponse({"exists": hit is not None})
+        return StreamingResponse(
+            _stream_search(sql_query, cache_key), media_type="application/json"
+        )
+    return Response(content=body, media_type="application/json")
 
-    tree = parser.parse(query)
-    sql_query = generate_event_sql_query(tree)
-    if sql_query is None:
-        raise HTTPException(status_code=404, detail="Item not found")
-    result = session.exec(sql_query).all()
-    return result
+
+async def _stream_search(sql_query: SelectOfScalar, cache_key: tuple[int, str]):
+    """Streams the events matching a search as a JSON array.
+
+    Events are fetched and serialized one partition at a time, so memory stays
+    bounded by the partition size. Bodies small enough to cache are collected
+    on the way and cached once complete.
+    """
+    chunks: list[bytes] | None = [b"["]
+    size = 1
+    yield b"["
+    # The stream outlives the endpoint call, so it owns its own session
+    async with AsyncSessionMaker() as session:
+        result = await session.stream(
+            sql_query, execution_options={"yield_per": _SEARCH_PARTITION_SIZE}
+        )
+        separator = b""
+        async for partition in result.scalars().partitions():
+            chunk = separator + b",".join(
+                _dumps(event.model_dump()) for event in partition
+            )
+            separator = b","
+            yield chunk
+            if chunks is not None:
+                size += len(chunk)
+                if size > _SEARCH_CACHE_MAX_BODY:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+    yield b"]"
+    if chunks is not None:
+        chunks.append(b"]")
+        _search_cache[cache_key] = b"".join(chunks)
+
+
+@app.get(
+    "/events/rollup",
+    tags=["event"],
+    summary="Get hourly event counts per source",
+    response_description="Event counts per source and hour",
+    response_model=list[EventRollup],
+)
+async def get_event_rollup(
+    source_id: int | None = None,
+    since: datetime | None = None,
+    session: AsyncSession = Depends(get_session),
+):
+    query = select(EventRollup)
+    if source_id is not None:
+        query = query.where(EventRollup.source_id == source_id)
+    if since is not None:
+        query = query.where(EventRollup.bucket_ts >= since)
+    rollup = (await session.exec(query.order_by(EventRollup.bucket_ts))).all()
+    return rollup
 
 
 @app.get(
@@ -146,17 +446,36 @@ def search_events(
     response_description="The retrieved event",
     responses={404: {"description": "Event not found"}},
 )
-def get_event(event_id: int, session: Session = Depends(get_session)):
-    event = session.get(Event, event_id)
+async def get_event(event_id: int, session: AsyncSession = Depends(get_session)):
+    event = await session.get(Event, event_id)
     if event is None:
         raise HTTPException(status_code=404, detail="Event not found")
     return event
 
 
+async def _prepare_database():
+    await create_database()
+    await engine.dispose()
+
+
 def main():
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Create the schema once before the workers start, so their lifespans only
+    # find it in place rather than racing to create it
+    asyncio.run(_prepare_database())
+    # Multiple workers need the app as an import string so each can load it
+    workers = int(os.getenv("MINI_SIEM_WORKERS", os.cpu_count() or 1))
+    uvicorn.run(
+        "mini_siem:app",
+        host="0.0.0.0",
+        port=8000,
+        # uvloop comes with uvicorn[standard] except on Windows; auto uses it
+        # wherever it is installed
+        loop="auto",
+        http="httptools",
+        workers=workers,
+    )
 
 
 if __name__ == "__main__":
@@ -4,27 +4,105 @@ It includes the following components:
 
 * An `Action` enum representing possible actions that can be taken in response to an event.
 * An `Event` model representing an event that occurred in the system.
+* An `EventCreate` model representing an event as submitted to the API.
 * A `Source` model representing a source of events in the system.
+* A `SourceCreate` model representing a source as submitted to the API.
+* An `EventRollup` model holding hourly event counts per source.
+* `EventPage` and `SourcePage` models holding one page of a paginated listing.
 * An `Alert` model representing an alert triggered by a rule.
 * A `Rule` model representing a rule that triggers alerts based on events.
-* A `create_database` function that creates a SQLite database with the specified file name and constructs the database engine.
+* An `indexed_data_columns` mapping of `Event.data` keys to their indexed generated columns.
+* A `create_database` coroutine that creates all tables in the SQLite database through the async engine.
 
 The database schema is defined using SQLModel, and the `create_database` function creates all tables in the database based on the SQLModel metadata.
 """
 
+import json
+import os
+import re
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import JSON, TIMESTAMP, Column
-from sqlmodel import Field, SQLModel, create_engine
-
-# Define the SQLite database file name
-_sqlite_file_name = "database.db"
-# Construct the SQLite URL
-_sqlite_url = f"sqlite:///{_sqlite_file_name}"
-
-# Create a database engine with echo mode enabled
-engine = create_engine(_sqlite_url, echo=True)
+import orjson
+from sqlalchemy import JSON, TIMESTAMP, Column, Computed, Connection, Text, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateColumn
+from sqlmodel import Field, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# Define the SQLite database file name, overridable with MINI_SIEM_DATABASE
+_sqlite_file_name = os.getenv("MINI_SIEM_DATABASE", "database.db")
+# Construct the SQLite URL, using the aiosqlite driver
+_sqlite_url = f"sqlite+aiosqlite:///{_sqlite_file_name}"
+
+# SQLAlchemy keeps compiled SQL per statement structure. Size that cache to hold
+# every search the parser's compile cache (1024 entries) keeps alongside the API's
+# own statements, so a cached search is never recompiled.
+_query_cache_size = 2048
+
+
+def _json_serializer(value) -> str:
+    # orjson produces bytes, while the JSON column type stores text
+    try:
+        return orjson.dumps(value).decode()
+    except TypeError:
+        # orjson rejects what it cannot encode natively, such as integers
+        # beyond 64 bits, which the standard library still stores
+        return json.dumps(value)
+
+
+# orjson reads integers beyond 64 bits back as floats. Any such integer has at
+# least 19 digits, so only text holding a run that long goes through the
+# standard library, which keeps them exact.
+_long_digits = re.compile(r"\d{19,}")
+
+
+def _json_deserializer(text: str):
+    if _long_digits.search(text):
+        return json.loads(text)
+    return orjson.loads(text)
+
+
+# Create an async database engine, using orjson for JSON columns. The pool keeps
+# enough warm connections for many concurrent readers; the file is local, so
+# connections never go stale and need neither pre-ping nor recycling. The pool
+# class is explicit, as older SQLAlchemy releases give aiosqlite files a NullPool.
+engine = create_async_engine(
+    _sqlite_url,
+    echo=False,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=20,
+    max_overflow=40,
+    query_cache_size=_query_cache_size,
+    json_serializer=_json_serializer,
+    json_deserializer=_json_deserializer,
+)
+
+# Connection-level SQLite tuning: WAL lets readers run alongside the writer,
+# NORMAL sync is durable enough under WAL, and a 64 MB page cache plus mmap
+# keeps hot pages out of the filesystem.
+_sqlite_pragmas = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in _sqlite_pragmas:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+# Session factory shared by the API layer; objects stay usable after commit
+AsyncSessionMaker = async_sessionmaker(
+    engine, class_=AsyncSession, expire_on_commit=False
+)
 
 
 class Action(Enum):
@@ -58,11 +136,28 @@ class Event(SQLModel, table=True):
     """
 
     id: int | None = Field(primary_key=True, default=None)
-    timestamp: datetime | None = Field(sa_column=Column(TIMESTAMP))
-    source: int = Field(foreign_key="source.id")
+    timestamp: datetime | None = Field(sa_column=Column(TIMESTAMP, index=True))
+    source: int = Field(foreign_key="source.id", index=True)
     data: dict = Field(sa_column=Column(JSON))
 
 
+class EventCreate(SQLModel):
+    """Represents an event as submitted to the API, before it is stored.
+
+    Unlike the `Event` table model, this model is fully validated by Pydantic.
+
+    Attributes:
+    timestamp (datetime | None): Timestamp when the event occurred.
+    source (int): ID of the source of the event.
+    data (dict): Additional data associated with the event.
+
+    """
+
+    timestamp: datetime | None
+    source: int
+    data: dict
+
+
 class Source(SQLModel, table=True):
     """Represents a source of events in the system.
 
@@ -80,6 +175,69 @@ class Source(SQLModel, table=True):
     description: str | None
 
 
+class SourceCreate(SQLModel):
+    """Represents a source as submitted to the API, before it is stored.
+
+    Unlike the `Source` table model, this model is fully validated by Pydantic.
+
+    Attributes:
+    name (str): Name of the source.
+    type (str): Type of the source.
+    description (str): Description of the source.
+
+    """
+
+    name: str
+    type: str
+    description: str | None
+
+
+class EventRollup(SQLModel, table=True):
+    """Represents the number of events received from a source within an hour.
+
+    Rows are maintained by a trigger on the event table, so counting events per
+    source and hour does not have to scan the events themselves.
+
+    Attributes:
+    source_id (int): Foreign key referencing the source of the events (primary key).
+    bucket_ts (datetime): Start of the hour the events occurred in (primary key).
+    count (int): Number of events in the hour.
+
+    """
+
+    __tablename__ = "event_rollup"  # type: ignore[assignment]
+
+    source_id: int = Field(foreign_key="source.id", primary_key=True)
+    bucket_ts: datetime = Field(sa_column=Column(TIMESTAMP, primary_key=True))
+    count: int = 0
+
+
+class EventPage(SQLModel):
+    """Represents one page of events, ordered by ID.
+
+    Attributes:
+    items (list[Event]): Events in the page.
+    next_cursor (int | None): Cursor for the next page, or None if this is the last page.
+
+    """
+
+    items: list[Event]
+    next_cursor: int | None
+
+
+class SourcePage(SQLModel):
+    """Represents one page of sources, ordered by ID.
+
+    Attributes:
+    items (list[Source]): Sources in the page.
+    next_cursor (int | None): Cursor for the next page, or None if this is the last page.
+
+    """
+
+    items: list[Source]
+    next_cursor: int | None
+
+
 class Alert(SQLModel, table=True):
     """Represents an alert triggered by a rule.
 
@@ -122,6 +280,77 @@ class Rule(SQLModel, table=True):
     enabled: bool
 
 
-def create_database():
+# Top-level keys of `Event.data` that get an indexed generated column, read from
+# a comma-separated environment variable, e.g. MINI_SIEM_INDEXED_DATA_KEYS=src_ip,dest_ip
+_indexed_data_keys = [
+    key.strip()
+    for key in os.getenv("MINI_SIEM_INDEXED_DATA_KEYS", "").split(",")
+    if key.strip()
+]
+for _key in _indexed_data_keys:
+    # Keys end up in DDL, so only plain identifiers are accepted
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z_0-9]*", _key):
+        raise ValueError(f"Invalid indexed data key: {_key!r}")
+
+# Generated columns by data key, attached to the event table. They hold the same
+# JSON-quoted value SQLAlchemy compares against for `Event.data[key]`, so queries
+# can filter on them in place of the JSON expression and hit their index.
+indexed_data_columns = {
+    key: Column(
+        f"data_{key}",
+        Text,
+        Computed(f"json_quote(json_extract(data, '$.\"{key}\"'))", persisted=False),
+        index=True,
+    )
+    for key in _indexed_data_keys
+}
+for _data_column in indexed_data_columns.values():
+    Event.__table__.append_column(_data_column)  # type: ignore[attr-defined]
+
+
+def _create_indexes(conn: Connection):
+    # create_all skips existing tables, so add missing columns and indexes to them
+    existing = {row[1] for row in conn.exec_driver_sql("PRAGMA table_xinfo(event)")}
+    for data_column in indexed_data_columns.values():
+        if data_column.name not in existing:
+            column_ddl = CreateColumn(data_column).compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE event ADD COLUMN {column_ddl}")
+    for index in Event.__table__.indexes:  # type: ignore[attr-defined]
+        index.create(conn, checkfirst=True)
+
+
+# Hour buckets use the same text format SQLAlchemy stores datetimes in, so they
+# compare correctly against bound datetime parameters
+_rollup_bucket = "strftime('%Y-%m-%d %H:00:00.000000', {timestamp})"
+
+
+def _create_rollup_trigger(conn: Connection):
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'event_rollup_insert'"
+    ).first()
+    if exists:
+        return
+    # Events are never updated or deleted, so counting inserts is enough
+    conn.exec_driver_sql(f"""
+        CREATE TRIGGER event_rollup_insert AFTER INSERT ON event
+        WHEN NEW.timestamp IS NOT NULL
+        BEGIN
+            INSERT INTO event_rollup (source_id, bucket_ts, count)
+            VALUES (NEW.source, {_rollup_bucket.format(timestamp="NEW.timestamp")}, 1)
+            ON CONFLICT (source_id, bucket_ts) DO UPDATE SET count = count + 1;
+        END
+    """)
+    # Count the events stored before the trigger existed
+    conn.exec_driver_sql(f"""
+        INSERT OR REPLACE INTO event_rollup (source_id, bucket_ts, count)
+        SELECT source, {_rollup_bucket.format(timestamp="timestamp")}, count(*)
+        FROM event WHERE timestamp IS NOT NULL GROUP BY 1, 2
+    """)
+
+
+async def create_database():
     # Create all tables in the database based on the SQLModel metadata
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_create_indexes)
+        await conn.run_sync(_create_rollup_trigger)
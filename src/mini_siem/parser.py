@@ -1,96 +1,185 @@
 """SQL Query Parser and Generator Module
 
-This module provides functionality for parsing and generating SQL queries based on a custom grammar.
-It uses the Lark library for parsing and the SQLModel library for generating SQL queries.
+This module provides functionality for parsing and generating SQL queries based on a custom query language.
+It uses a small hand-written tokenizer and recursive-descent parser, and the SQLModel library for generating SQL queries.
 
-The module defines a grammar for parsing queries, which can be used to filter events based on various attributes.
-It also provides functions for generating SQL queries from parsed query trees.
+The query language can be used to filter events based on various attributes:
+
+    query: filter (("and" | "or") filter)*
+    filter: (attr | nested_attr) (cmp value | "in" values)
+    cmp: ">" | "<" | "=" | "<=" | ">=" | "!="
+    attr: "id" | "timestamp" | "source"
+    nested_attr: "data" ("." key)*
+    values: "(" value ("," value)* ")"
+    value: SIGNED_NUMBER | ESCAPED_STRING | VARIABLE
+
+Filters are combined from left to right. Parsing emits SQLAlchemy expressions directly,
+without building an intermediate parse tree.
 
 Classes:
     None
 
 Functions:
-    generate_event_sql_query(tree: lark.Tree) -> SelectOfScalar:
-        Generates a SQL query from a parsed query tree.
-    _handle_query(query):
-        Handles a query node in the parsed query tree.
-    _handle_filter(filter) -> bool:
-        Handles a filter node in the parsed query tree.
+    compile_event_sql_query(query: str) -> SelectOfScalar:
+        Parses a query string and generates its SQL query, caching the result.
+    clear_cache():
+        Clears the compiled query cache.
+    generate_event_sql_query(query: str) -> SelectOfScalar:
+        Generates a SQL query from a query string.
+    _tokenize(query: str) -> deque[tuple[str, str]]:
+        Splits a query string into tokens.
+    _handle_query(tokens) -> ColumnElement[bool]:
+        Handles a sequence of filters joined by AND and OR.
+    _handle_filter(tokens) -> ColumnElement[bool]:
+        Handles a single filter.
+    _handle_values(tokens) -> list[str]:
+        Handles a parenthesized list of values.
+    _handle_value(tokens) -> str:
+        Handles a single value.
+    _nested_attr(path: tuple[str, ...]):
+        Resolves a path into the event data to a column expression, caching the result.
 
 Variables:
-    query_grammar (str):
-        The grammar for parsing queries.
-    parser (lark.Lark):
-        The parser instance for the query grammar.
+    Tokens (type):
+        The token queue shared by the parsing functions.
 """
 
 import operator
+import re
+from collections import deque
+from functools import lru_cache
 from typing import cast
 
-import lark
 from sqlalchemy import ColumnElement
 from sqlmodel import and_, or_, select
 from sqlmodel.sql._expression_select_cls import SelectOfScalar
 
-from mini_siem.models import Event
+from mini_siem.models import Event, indexed_data_columns
+
+_TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<cmp>>=|<=|!=|=|<|>)
+      | (?P<number>[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+      | (?P<dot>\.)
+      | (?P<lparen>\()
+      | (?P<rparen>\))
+      | (?P<comma>,)
+      | (?P<error>\S)
+    )
+    """,
+    re.VERBOSE,
+)
+
+Tokens = deque[tuple[str, str]]
+
+_OPS = {
+    ">": operator.gt,
+    "<": operator.lt,
+    "=": operator.eq,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+}
+
+_ATTRS = {
+    "id": Event.id,
+    "timestamp": Event.timestamp,
+    "source": Event.source,
+}
+
+
+@lru_cache(maxsize=1024)
+def compile_event_sql_query(query: str) -> SelectOfScalar:
+    """Parses a query string and generates the matching SQL query.
+
+    Parsing and SQL generation are deterministic in the query string, and the
+    resulting select is immutable, so results are cached and shared between
+    requests.
 
-query_grammar = r"""
-    start: query
-    ?query: filter ((AND | OR) filter)*
-    filter: attr cmp value | nested_attr cmp value
-    cmp: ">" | "<" | "=" |  "<=" | ">=" | "!=" | "in"
-    attr: "id" | "timestamp" | "source"
-    nested_attr: "data" ( "." key )*
-    key: CNAME
-    value: SIGNED_NUMBER | ESCAPED_STRING | VARIABLE
-    AND: " and " 
-    OR: " or "
-    %import common.CNAME
-    %import common.ESCAPED_STRING
-    %import common.SIGNED_NUMBER
-    VARIABLE: /[a-zA-Z_][a-zA-Z_0-9]*/
-    NUMBER: /\d+/
-"""
+    Args:
+        query (str): The raw query string
 
-parser = lark.Lark(query_grammar, start="start", keep_all_tokens=True)
+    Returns:
+        SelectOfScalar: The generated SQL query
+
+    """
+    return generate_event_sql_query(query)
 
 
-def generate_event_sql_query(tree: lark.Tree) -> SelectOfScalar:
-    """Generates a SQL query from a parsed query tree.
+def clear_cache():
+    """Clears the compiled query cache."""
+    compile_event_sql_query.cache_clear()
+
+
+def generate_event_sql_query(query: str) -> SelectOfScalar:
+    """Generates a SQL query from a query string.
 
     Args:
-        tree (lark.Tree): The parsed query tree
+        query (str): The query string
 
     Returns:
         SelectOfScalar: The generated SQL query
 
+    Raises:
+        ValueError: If the query is not valid
+
     Example:
-        >>> query_tree = parser.parse("id = 1 and timestamp > 1643723400")
-        >>> sql_query = generate_event_sql_query(query_tree)
+        >>> sql_query = generate_event_sql_query("id=1 and timestamp>1643723400")
         >>> print(sql_query)
         SELECT * FROM events WHERE events.id = 1 AND events.timestamp > 1643723400
 
     """
-    query = select(Event)
-    clauses = []
-    for child in tree.children:
-        if child.data == "filter":
-            clauses.append(_handle_filter(child))
-        elif child.data == "query":
-            clauses.append(_handle_query(child))
-    if clauses:
-        query = query.where(*clauses)
-    return query
+    tokens = _tokenize(query)
+    clause = _handle_query(tokens)
+    return select(Event).where(clause)
+
+
+def _tokenize(query: str) -> Tokens:
+    """Splits a query string into (kind, text) tokens.
+
+    Keywords such as "and", "or" and "in" are returned as names; the parser
+    tells them apart by position.
+
+    Args:
+        query (str): The query string
+
+    Returns:
+        Tokens: The tokens, in order
+
+    Raises:
+        ValueError: If the query contains an unexpected character
+
+    """
+    tokens: Tokens = deque()
+    for match in _TOKEN.finditer(query):
+        kind = cast(str, match.lastgroup)
+        text = match.group(kind)
+        if kind == "error":
+            raise ValueError(
+                f"Unexpected character {text!r} at position {match.start(kind)}"
+            )
+        tokens.append((kind, text))
+    return tokens
+
+
+def _next_token(tokens: Tokens, expected: str) -> tuple[str, str]:
+    """Pops the next token, failing if the query has ended."""
+    if not tokens:
+        raise ValueError(f"Unexpected end of query; expected {expected}")
+    return tokens.popleft()
 
 
-def _handle_query(query: lark.Tree) -> ColumnElement[bool]:
-    """Handles a query node in the parsed query tree.
+def _handle_query(tokens: Tokens) -> ColumnElement[bool]:
+    """Handles a sequence of filters joined by AND and OR.
 
-    This function takes a query node and recursively processes its children to generate a SQL filter clause.
-    It supports AND and OR operators and can handle nested filters.
+    Filters are combined from left to right, so "a or b and c" becomes
+    "(a or b) and c".
 
     Args:
-        query (lark.Tree): The query node
+        tokens (Tokens): The remaining query tokens
 
     Returns:
         ColumnElement[bool]: The resulting filter clause
@@ -99,61 +188,119 @@ def _handle_query(query: lark.Tree) -> ColumnElement[bool]:
         ValueError: If an unexpected operator is encountered
 
     """
-    left_filter = _handle_filter(query.children[0])
-
-    # Start iterating from the first operator (at index 1)
-    i = 1
-    while i < len(query.children):
-        op: str = cast(lark.Token, query.children[i]).type
-        right_filter = _handle_filter(query.children[i + 1])
-
-        if op == "OR":
-            left_filter = or_(left_filter, right_filter)
-        elif op == "AND":
-            left_filter = and_(left_filter, right_filter)
+    left_filter = _handle_filter(tokens)
+
+    while tokens:
+        _, op = tokens.popleft()
+        if op == "or":
+            left_filter = or_(left_filter, _handle_filter(tokens))
+        elif op == "and":
+            left_filter = and_(left_filter, _handle_filter(tokens))
         else:
             raise ValueError("Unexpected Clause; expected AND or OR, got %s" % op)
 
-        # Move to the next operator and filter pair
-        i += 2
+    return left_filter
 
-    return cast(ColumnElement[bool], left_filter)
 
-
-def _handle_filter(filter: lark.Tree) -> bool:
-    """Handles a filter node in the parsed query tree.
+def _handle_filter(tokens: Tokens) -> ColumnElement[bool]:
+    """Handles a single filter, consuming its tokens.
 
     Args:
-        filter (lark.Tree): The filter node
+        tokens (Tokens): The remaining query tokens
 
     Returns:
-        bool: The resulting filter clause
+        ColumnElement[bool]: The resulting filter clause
+
+    Raises:
+        ValueError: If the filter is not valid
 
     """
-    attr_or_nested_attr = filter.children[0]
-    cmp: str = cast(lark.Token, filter.children[1].children[0]).value
-    value = cast(lark.Token, filter.children[2].children[0]).value
-    ops = {
-        ">": operator.gt,
-        "<": operator.lt,
-        "=": operator.eq,
-        ">=": operator.ge,
-        "<=": operator.le,
-        "!=": operator.ne,
-        "in": operator.contains,
-    }
-    if attr_or_nested_attr.data == "attr":
-        attr = cast(lark.Token, attr_or_nested_attr.children[0]).value
-        return ops[cmp](getattr(Event, attr), value)
-    if attr_or_nested_attr.data == "nested_attr":
+    kind, attr_name = _next_token(tokens, "an attribute")
+    if kind == "name" and attr_name == "data":
         nested_attr_path = []
-        for filter in attr_or_nested_attr.children[1:]:
-            if isinstance(filter, lark.Tree):
-                nested_attr_path.append(cast(lark.Token, filter.children[0]).value)
-            elif filter.type == "KEY":
-                nested_attr_path.append(filter.value)
-        attr = Event.data
-        for path in nested_attr_path:
-            attr = attr[path]
-        return ops[cmp](attr, value)
-    return False
+        while tokens and tokens[0][0] == "dot":
+            tokens.popleft()
+            kind, key = _next_token(tokens, "a key")
+            if kind != "name":
+                raise ValueError(f"Unexpected key {key!r}")
+            nested_attr_path.append(key)
+        attr = _nested_attr(tuple(nested_attr_path))
+    elif kind == "name" and attr_name in _ATTRS:
+        attr = _ATTRS[attr_name]
+    else:
+        raise ValueError(f"Unexpected attribute {attr_name!r}")
+
+    kind, cmp = _next_token(tokens, "a comparison")
+    if kind == "name" and cmp == "in":
+        return attr.in_(_handle_values(tokens))
+    if kind != "cmp":
+        raise ValueError(f"Unexpected comparison {cmp!r}")
+
+    return _OPS[cmp](attr, _handle_value(tokens))
+
+
+def _handle_values(tokens: Tokens) -> list[str]:
+    """Handles a parenthesized, comma-separated list of values.
+
+    Args:
+        tokens (Tokens): The remaining query tokens
+
+    Returns:
+        list[str]: The values, in order
+
+    Raises:
+        ValueError: If the list is not valid
+
+    """
+    kind, text = _next_token(tokens, "(")
+    if kind != "lparen":
+        raise ValueError(f"Unexpected {text!r}; expected (")
+    values = [_handle_value(tokens)]
+    while True:
+        kind, text = _next_token(tokens, ", or )")
+        if kind == "rparen":
+            return values
+        if kind != "comma":
+            raise ValueError(f"Unexpected {text!r}; expected , or )")
+        values.append(_handle_value(tokens))
+
+
+def _handle_value(tokens: Tokens) -> str:
+    """Handles a single value, consuming its token.
+
+    Args:
+        tokens (Tokens): The remaining query tokens
+
+    Returns:
+        str: The raw value
+
+    Raises:
+        ValueError: If the value is not valid
+
+    """
+    kind, value = _next_token(tokens, "a value")
+    if kind not in ("number", "string", "name"):
+        raise ValueError(f"Unexpected value {value!r}")
+    return value
+
+
+@lru_cache(maxsize=1024)
+def _nested_attr(path: tuple[str, ...]):
+    """Resolves a path of keys into the event data to a column expression.
+
+    Single keys with an indexed generated column resolve to that column, so the
+    filter can use its index.
+
+    Args:
+        path (tuple[str, ...]): The keys, outermost first
+
+    Returns:
+        The JSON column expression for the path
+
+    """
+    if len(path) == 1 and path[0] in indexed_data_columns:
+        return indexed_data_columns[path[0]]
+    attr = Event.data
+    for key in path:
+        attr = attr[key]
+    return attr
@@ -0,0 +1,28 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# The engine is built on import, so point it at a scratch database first
+_database = Path(tempfile.mkdtemp()) / "database.db"
+os.environ["MINI_SIEM_DATABASE"] = str(_database)
+
+import mini_siem  # noqa: E402
+
+
+@pytest.fixture
+def database():
+    # The lifespan disposes the engine, so no connection holds the files here
+    for path in _database.parent.glob(_database.name + "*"):
+        path.unlink()
+    mini_siem._search_cache.clear()
+    return _database
+
+
+@pytest.fixture
+def client(database):
+    with TestClient(mini_siem.app) as client:
+        client.post("/sources/", json={"name": "firewall", "type": "syslog"})
+        yield client
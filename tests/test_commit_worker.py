@@ -0,0 +1,116 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+import httpx
+import pytest
+
+import mini_siem
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    # The app and its commit worker are written against asyncio
+    return "asyncio"
+
+
+def _event(source=1):
+    return {"timestamp": "2024-01-01T00:00:00", "source": source, "data": {}}
+
+
+@asynccontextmanager
+async def _serve():
+    async with mini_siem.lifespan(mini_siem.app):
+        transport = httpx.ASGITransport(app=mini_siem.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            await client.post("/sources/", json={"name": "firewall", "type": "syslog"})
+            yield client
+
+
+class _Gate:
+    """Records batch sizes, holding the first batch until it is released, so
+    every request that misses it lands in the next one."""
+
+    def __init__(self, commit_batch):
+        self.sizes = []
+        self.released = asyncio.Event()
+        self._commit_batch = commit_batch
+
+    async def commit_batch(self, batch):
+        self.sizes.append(len(batch))
+        if len(self.sizes) == 1:
+            await self.released.wait()
+        await self._commit_batch(batch)
+
+    async def waiting(self, count):
+        """Waits until `count` requests are in the held batch or queued."""
+        while sum(self.sizes) + mini_siem._commit_queue.qsize() < count:
+            await asyncio.sleep(0)
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    gate = _Gate(mini_siem._commit_batch)
+    monkeypatch.setattr(mini_siem, "_commit_batch", gate.commit_batch)
+    return gate
+
+
+async def _post_all(client, events, gate):
+    posts = [asyncio.create_task(client.post("/events/", json=e)) for e in events]
+    # Requests that miss the held batch queue up behind it
+    await gate.waiting(len(events))
+    gate.released.set()
+    responses = await asyncio.wait_for(asyncio.gather(*posts), timeout=10)
+    return [response.status_code for response in responses]
+
+
+async def test_concurrent_posts_share_a_batch(database, gate):
+    async with _serve() as client:
+        statuses = await _post_all(client, [_event() for _ in range(5)], gate)
+        events = (await client.get("/events/")).json()["items"]
+
+    assert statuses == [200] * 5
+    assert sum(gate.sizes) == 5
+    assert len(gate.sizes) <= 2
+    assert len(events) == 5
+
+
+async def test_bad_request_fails_only_itself(database, gate):
+    # SQLite integers are 64 bits, so this source overflows on insert
+    events = [_event(), _event(), _event(source=2**70), _event()]
+    async with _serve() as client:
+        statuses = await _post_all(client, events, gate)
+        stored = (await client.get("/events/")).json()["items"]
+
+    assert statuses == [200, 200, 500, 200]
+    assert sum(gate.sizes) == 4
+    assert len(gate.sizes) <= 2
+    assert len(stored) == 3
+
+
+async def test_post_after_worker_stopped(database):
+    async with _serve() as client:
+        mini_siem._commit_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await mini_siem._commit_task
+        response = await asyncio.wait_for(
+            client.post("/events/", json=_event()), timeout=10
+        )
+
+    assert response.status_code == 503
+
+
+async def test_stopping_worker_fails_waiting_requests(database, gate):
+    async with _serve() as client:
+        posts = [
+            asyncio.create_task(client.post("/events/", json=_event()))
+            for _ in range(3)
+        ]
+        await gate.waiting(3)
+        mini_siem._commit_task.cancel()
+        responses = await asyncio.wait_for(asyncio.gather(*posts), timeout=10)
+
+    assert [response.status_code for response in responses] == [500] * 3
@@ -0,0 +1,26 @@
+def _event(**data):
+    return {"timestamp": "2024-01-01T00:00:00", "source": 1, "data": data}
+
+
+def test_large_integers_round_trip(client):
+    assert client.post("/events/", json=_event(big=2**70, small=1)).status_code == 200
+
+    [event] = client.get("/events/").json()["items"]
+    assert event["data"] == {"big": 2**70, "small": 1}
+    assert client.get("/events/1").json()["data"]["big"] == 2**70
+    assert client.get("/events/search", params={"query": "id=1"}).json()[0]["data"] == {
+        "big": 2**70,
+        "small": 1,
+    }
+
+
+def test_search_in(client):
+    client.post("/events/", json=[_event(kind="x"), _event(kind="y"), _event(kind=3)])
+
+    def ids(query):
+        response = client.get("/events/search", params={"query": query})
+        return [event["id"] for event in response.json()]
+
+    assert ids("id in (1, 3)") == [1, 3]
+    assert ids('data.kind in ("x", 3)') == [1, 3]
+    assert ids('data.kind in ("z")') == []
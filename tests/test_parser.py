@@ -0,0 +1,121 @@
+import pytest
+
+from mini_siem.parser import generate_event_sql_query
+
+
+def _compile_where(query: str) -> tuple[str, dict]:
+    compiled = generate_event_sql_query(query).whereclause.compile()
+    return str(compiled), compiled.params
+
+
+@pytest.mark.parametrize(
+    ("query", "where", "params"),
+    [
+        ("id=1", "event.id = :id_1", {"id_1": "1"}),
+        (
+            "id>1 and source=1",
+            "event.id > :id_1 AND event.source = :source_1",
+            {"id_1": "1", "source_1": "1"},
+        ),
+        (
+            "id >= 1 and id < 3 or source != 2",
+            "event.id >= :id_1 AND event.id < :id_2 OR event.source != :source_1",
+            {"id_1": "1", "id_2": "3", "source_1": "2"},
+        ),
+        (
+            "id=1 or id=2 and id=3",
+            "(event.id = :id_1 OR event.id = :id_2) AND event.id = :id_3",
+            {"id_1": "1", "id_2": "2", "id_3": "3"},
+        ),
+    ],
+)
+def test_and_or_chains(query, where, params):
+    assert _compile_where(query) == (where, params)
+
+
+@pytest.mark.parametrize(
+    ("query", "where", "params"),
+    [
+        (
+            "data.alert.severity=2",
+            "event.data[:data_1][:param_1] = :param_2",
+            {"data_1": "alert", "param_1": "severity", "param_2": "2"},
+        ),
+        (
+            "data.a.b.c!=x_y",
+            "event.data[:data_1][:param_1][:param_2] != :param_3",
+            {"data_1": "a", "param_1": "b", "param_2": "c", "param_3": "x_y"},
+        ),
+    ],
+)
+def test_nested_data(query, where, params):
+    assert _compile_where(query) == (where, params)
+
+
+@pytest.mark.parametrize(
+    ("query", "params"),
+    [
+        ('data.src_ip="1.2.3.4"', {"data_1": "src_ip", "param_1": '"1.2.3.4"'}),
+        ('data.msg="a \\"q\\" b"', {"data_1": "msg", "param_1": '"a \\"q\\" b"'}),
+    ],
+)
+def test_quoted_strings(query, params):
+    assert _compile_where(query) == ("event.data[:data_1] = :param_1", params)
+
+
+@pytest.mark.parametrize(
+    ("query", "where", "params"),
+    [
+        (
+            "timestamp>-1.5e3",
+            "event.timestamp > :timestamp_1",
+            {"timestamp_1": "-1.5e3"},
+        ),
+        ("source<=+2", "event.source <= :source_1", {"source_1": "+2"}),
+        ("id=.5", "event.id = :id_1", {"id_1": ".5"}),
+    ],
+)
+def test_signed_numbers(query, where, params):
+    assert _compile_where(query) == (where, params)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "",
+        "foo=1",
+        "id=",
+        "id=1 and",
+        "id=1 xor id=2",
+        "data.=1",
+        "id=1 & id=2",
+        "id in 1",
+        "id in ()",
+        "id in (1",
+        "id in (1 2)",
+        "id in (1,)",
+    ],
+)
+def test_invalid_query(query):
+    with pytest.raises(ValueError):
+        generate_event_sql_query(query)
+
+
+@pytest.mark.parametrize(
+    ("query", "where", "params"),
+    [
+        ("id in (1, 2)", "event.id IN (__[POSTCOMPILE_id_1])", {"id_1": ["1", "2"]}),
+        (
+            "source in (1)",
+            "event.source IN (__[POSTCOMPILE_source_1])",
+            {"source_1": ["1"]},
+        ),
+        (
+            'data.a in ("x", 3)',
+            "event.data[:data_1] IN (__[POSTCOMPILE_param_1])",
+            {"data_1": "a", "param_1": ['"x"', "3"]},
+        ),
+    ],
+)
+def test_in(query, where, params):
+    assert _compile_where(query) == (where, params)
@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+from cachetools import TTLCache
+
+import mini_siem
+
+
+def _event(**data):
+    return {"timestamp": "2024-01-01T00:00:00", "source": 1, "data": data}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the search cache with one driven by a fake clock."""
+    now = [0.0]
+    cache = TTLCache(
+        maxsize=mini_siem._search_cache.maxsize,
+        ttl=mini_siem._search_cache.ttl,
+        timer=lambda: now[0],
+        getsizeof=len,
+    )
+    monkeypatch.setattr(mini_siem, "_search_cache", cache)
+    return now
+
+
+def _insert_behind_the_api(database):
+    # Writes that skip add_event leave the generation, and so the cache, alone
+    with sqlite3.connect(database) as conn:
+        conn.execute(
+            "INSERT INTO event (timestamp, source, data) "
+            "VALUES ('2024-01-01 00:00:00.000000', 1, '{}')"
+        )
+
+
+def _ids(client, query="source=1"):
+    response = client.get("/events/search", params={"query": query})
+    return [event["id"] for event in response.json()]
+
+
+def test_hit_serves_cached_body(client, database, clock):
+    client.post("/events/", json=_event())
+    assert _ids(client) == [1]
+
+    _insert_behind_the_api(database)
+    assert _ids(client) == [1]
+
+
+def test_entries_expire(client, database, clock):
+    client.post("/events/", json=_event())
+    assert _ids(client) == [1]
+
+    _insert_behind_the_api(database)
+    clock[0] += mini_siem._search_cache.ttl
+    assert _ids(client) == [1, 2]
+
+
+def test_add_event_bumps_generation(client, clock):
+    client.post("/events/", json=_event())
+    generation = mini_siem._search_generation
+    assert _ids(client) == [1]
+
+    client.post("/events/", json=_event())
+    assert mini_siem._search_generation == generation + 1
+    assert _ids(client) == [1, 2]
+
+
+def test_large_bodies_are_not_cached(client, clock, monkeypatch):
+    monkeypatch.setattr(mini_siem, "_SEARCH_CACHE_MAX_BODY", 10)
+    client.post("/events/", json=_event())
+    assert _ids(client) == [1]
+    assert len(mini_siem._search_cache) == 0
+
+
+def test_exists_is_not_cached(client, clock):
+    response = client.get("/events/search", params={"query": "id=1", "exists": True})
+    assert response.json() == {"exists": False}
+    assert len(mini_siem._search_cache) == 0